@@ -1,5 +1,11 @@
 import asyncio
+import base64
+import copy
+import functools
 import os
+import re
+import time
+from operator import itemgetter
 from typing import Annotated
 from dotenv import load_dotenv
 from fastmcp import FastMCP
@@ -23,6 +29,17 @@ except ImportError:
 
 from mcp.server.auth.provider import AccessToken
 
+# orjson decodes noticeably faster than the stdlib parser; fall back to
+# httpx's built-in json() if it isn't installed
+try:
+    import orjson
+
+    def _json_loads(response: httpx.Response) -> dict:
+        return orjson.loads(response.content)
+except ImportError:
+    def _json_loads(response: httpx.Response) -> dict:
+        return response.json()
+
 load_dotenv()
 
 # ===== env / assertions =====
@@ -35,22 +52,61 @@ assert MY_NUMBER is not None, "Please set MY_NUMBER in your .env file"
 assert NASA_API_KEY is not None, "Please set NASA_API_KEY in your .env file"
 
 # ===== Auth provider =====
+CACHE_MAX = 1024  # bound on cached validated tokens
+
+# RSA keygen takes tens of ms and the key is only a placeholder for the
+# parent class, so generate it once per process no matter how many
+# providers are constructed.
+_KEYPAIR: RSAKeyPair | None = None
+
+def _get_keypair() -> RSAKeyPair:
+    global _KEYPAIR
+    if _KEYPAIR is None:
+        _KEYPAIR = RSAKeyPair.generate()
+    return _KEYPAIR
+
 class SimpleBearerAuthProvider(BearerAuthProvider):
     def __init__(self, token: str):
-        k = RSAKeyPair.generate()
+        k = _get_keypair()
         super().__init__(public_key=k.public_key, jwks_uri=None, issuer=None, audience=None)
         self.token = token
+        # Cache of already-validated tokens so repeat requests skip
+        # re-validation entirely; invalid tokens are never cached.
+        self._token_cache: dict[str, AccessToken] = {}
 
     async def load_access_token(self, token: str) -> AccessToken | None:
+        # Cheap syntactic pre-check: reject empty/obviously-malformed
+        # values before any cache or validation work. The configured
+        # static token is always allowed through to the comparison.
+        if not token:
+            return None
+        if token != self.token and token.count(".") != 2:
+            # Not our token and not even JWT-shaped -- junk/scan traffic.
+            return None
+
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return cached
+
         if token == self.token:
-            return AccessToken(
+            access = AccessToken(
                 token=token,
                 client_id="puch-client",
                 scopes=["*"],
                 expires_at=None,
             )
+            if len(self._token_cache) >= CACHE_MAX:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._token_cache.pop(next(iter(self._token_cache)))
+            self._token_cache[token] = access
+            return access
         return None
 
+# ===== Shared HTTP client =====
+# One client for the whole server so connections to api.nasa.gov and
+# api.le-systeme-solaire.net are kept alive and reused across tool calls.
+_client: httpx.AsyncClient | None = None
+
 # ===== ENABLE STATELESS MODE =====
 mcp = FastMCP(
     "NASA Astronomy MCP Server",  # Changed server name
@@ -68,90 +124,248 @@ async def validate() -> str:
     return MY_NUMBER
 
 # ===== NASA Astronomy Tools =====
+# APOD responses for past dates never change; today's changes once a day,
+# so cache it for an hour. Per-key locks coalesce concurrent misses into
+# a single upstream call.
+APOD_URL = "https://api.nasa.gov/planetary/apod"
+APOD_BASE_PARAMS = {"api_key": NASA_API_KEY, "thumbs": "True"}
+APOD_TODAY_TTL = 3600
+_apod_cache: dict[str, tuple[float, dict]] = {}
+_apod_locks: dict[str, asyncio.Lock] = {}
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def _apod_cache_get(key: str) -> dict | None:
+    cached = _apod_cache.get(key)
+    if cached is None:
+        return None
+    ts, data, _etag = cached
+    if key == "today" and time.time() - ts >= APOD_TODAY_TTL:
+        return None
+    return data
+
 async def fetch_apod(date: str = None) -> dict:
     """Fetch Astronomy Picture of the Day with image URL"""
-    url = f"https://api.nasa.gov/planetary/apod?api_key={NASA_API_KEY}&thumbs=True"
-    if date:
-        url += f"&date={date}"
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code != 200:
+    if date and not _DATE_RE.match(date):
+        raise McpError(ErrorData(
+            code=INVALID_PARAMS,
+            message="Invalid date; expected YYYY-MM-DD"
+        ))
+
+    key = date or "today"
+    data = _apod_cache_get(key)
+    if data is not None:
+        return data
+
+    lock = _apod_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Another caller may have filled the cache while we waited
+        data = _apod_cache_get(key)
+        if data is not None:
+            return data
+        return await _fetch_apod_uncached(key, date)
+
+
+async def _fetch_apod_uncached(key: str, date: str = None) -> dict:
+    params = APOD_BASE_PARAMS if date is None else {**APOD_BASE_PARAMS, "date": date}
+
+    # If we hold a stale entry with an ETag, revalidate it: a 304 carries
+    # no body, so we keep the cached dict and skip the JSON parse.
+    stale = _apod_cache.get(key)
+    headers = None
+    if stale is not None and stale[2]:
+        headers = {"If-None-Match": stale[2]}
+
+    response = await _client.get(APOD_URL, params=params, headers=headers)
+    if response.status_code == 304 and stale is not None:
+        _ts, data, etag = stale
+        _apod_cache[key] = (time.time(), data, etag)
+        return data
+    if response.status_code != 200:
+        raise McpError(ErrorData(
+            code=INVALID_PARAMS,
+            message="Failed to fetch APOD data"
+        ))
+
+    data = _json_loads(response)
+
+    # Determine the best image URL to use
+    image_url = data.get("hdurl", data.get("url"))
+    if data.get("media_type") == "video":
+        image_url = data.get("thumbnail_url")
+
+    result = {
+        "title": data.get("title", "Untitled"),
+        "date": data.get("date"),
+        "explanation": data.get("explanation"),
+        "media_type": data.get("media_type"),
+        "url": image_url,  # Always return the best available image URL
+        "hdurl": data.get("hdurl"),  # Still include hdurl if available
+        "thumbnail": data.get("thumbnail_url"),  # For videos
+    }
+    _apod_cache[key] = (time.time(), result, response.headers.get("etag"))
+    return result
+
+
+async def _fetch_image_base64(image_url: str) -> str:
+    # Stream the image and encode in 57 KiB chunks (a multiple of 3, so
+    # each chunk encodes without mid-stream padding) instead of holding
+    # the raw bytes and their base64 copy in memory at once.
+    # Accept-Encoding: identity avoids buffering a compressed payload too.
+    encoded = bytearray()
+    async with _client.stream(
+        "GET", image_url, headers={"Accept-Encoding": "identity"}
+    ) as image_response:
+        if image_response.status_code != 200:
             raise McpError(ErrorData(
-                code=INVALID_PARAMS,
-                message="Failed to fetch APOD data"
+                code=INTERNAL_ERROR,
+                message="Failed to fetch APOD image"
             ))
-        
-        data = response.json()
-        
-        # Determine the best image URL to use
-        image_url = data.get("hdurl", data.get("url"))
-        if data.get("media_type") == "video":
-            image_url = data.get("thumbnail_url")
-        
-        return {
-            "title": data.get("title", "Untitled"),
-            "date": data.get("date"),
-            "explanation": data.get("explanation"),
-            "media_type": data.get("media_type"),
-            "url": image_url,  # Always return the best available image URL
-            "hdurl": data.get("hdurl"),  # Still include hdurl if available
-            "thumbnail": data.get("thumbnail_url"),  # For videos
-        }
+        async for chunk in image_response.aiter_bytes(chunk_size=57 * 1024):
+            encoded += base64.b64encode(chunk)
+    return bytes(encoded).decode("ascii")
+
+
+async def fetch_apod_with_image(date: str = None) -> dict:
+    """Fetch APOD metadata plus the image itself as base64 data"""
+    result = dict(await fetch_apod(date))
+    image_url = result.get("url")
+    if not image_url:
+        result["image_base64"] = None
+        return result
 
+    result["image_base64"] = await _fetch_image_base64(image_url)
+    return result
+
+
+# Planetary facts are effectively static, so cache them for the life of
+# the process; after one pass over the planets every lookup is in-memory.
+_planet_cache: dict[str, dict] = {}
+_get_moon = itemgetter("moon")
+# Bodies we accept; rejecting typos locally saves a ~200 ms 404 round-trip
+_KNOWN_BODIES = frozenset({
+    "mercury", "venus", "earth", "mars", "jupiter", "saturn",
+    "uranus", "neptune", "pluto", "moon", "sun",
+})
 
 async def fetch_planet_info(planet: str) -> dict:
     """Fetch planetary data"""
-    url = f"https://api.le-systeme-solaire.net/rest/bodies/{quote_plus(planet.lower())}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code == 404:
+    name = planet.lower().strip()
+    if name not in _KNOWN_BODIES:
+        raise McpError(ErrorData(
+            code=INVALID_PARAMS,
+            message="Planet not found. Try: mercury, venus, earth, mars, jupiter, saturn, uranus, neptune"
+        ))
+
+    cached = _planet_cache.get(name)
+    if cached is not None:
+        # Copy so callers can't mutate the cached entry
+        return copy.deepcopy(cached)
+
+    url = f"https://api.le-systeme-solaire.net/rest/bodies/{quote_plus(name)}"
+    response = await _client.get(url)
+    if response.status_code == 404:
+        raise McpError(ErrorData(
+            code=INVALID_PARAMS,
+            message="Planet not found. Try: mercury, venus, earth, mars, jupiter, saturn, uranus, neptune"
+        ))
+
+    data = _json_loads(response)
+    result = {
+        "name": data.get("englishName"),
+        "is_planet": data.get("isPlanet", False),
+        "gravity": data.get("gravity"),
+        "density": data.get("density"),
+        "moons": list(map(_get_moon, data.get("moons") or ()))
+    }
+    _planet_cache[name] = result
+    return copy.deepcopy(result)
+
+# ===== MCP Tools =====
+def mcp_errors(fn):
+    """Wrap unexpected tool exceptions as McpError with INTERNAL_ERROR.
+
+    McpError (e.g. INVALID_PARAMS from the fetch helpers) passes through
+    untouched, so every tool shares one error shape without repeating the
+    try/except block.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        except McpError:
+            raise
+        except Exception as e:
             raise McpError(ErrorData(
-                code=INVALID_PARAMS,
-                message="Planet not found. Try: mercury, venus, earth, mars, jupiter, saturn, uranus, neptune"
+                code=INTERNAL_ERROR,
+                message=f"{fn.__name__} error: {str(e)}"
             ))
-        
-        data = response.json()
-        return {
-            "name": data.get("englishName"),
-            "is_planet": data.get("isPlanet", False),
-            "gravity": data.get("gravity"),
-            "density": data.get("density"),
-            "moons": [moon["moon"] for moon in data.get("moons", [])]
-        }
+    return wrapper
+
 
-# ===== MCP Tools =====
 @mcp.tool(description="Get NASA Astronomy Picture of the Day with image URL")
+@mcp_errors
 async def get_apod(
     date: Annotated[str, Field(description="Date in YYYY-MM-DD format (optional)")] = None
 ) -> dict:
     """Returns today's astronomy picture with its URL"""
-    try:
-        return await fetch_apod(date)
-    except Exception as e:
-        raise McpError(ErrorData(
-            code=INTERNAL_ERROR,
-            message=f"APOD fetch error: {str(e)}"
-        ))
+    return await fetch_apod(date)
+
+
+@mcp.tool(description="Get NASA Astronomy Picture of the Day with base64 image data")
+@mcp_errors
+async def get_apod_with_image(
+    date: Annotated[str, Field(description="Date in YYYY-MM-DD format (optional)")] = None
+) -> dict:
+    """Returns the astronomy picture with base64-encoded image data"""
+    return await fetch_apod_with_image(date)
+
+
+@mcp.tool(description="Get only the base64 image data for an APOD date")
+@mcp_errors
+async def get_apod_image_bytes(
+    date: Annotated[str, Field(description="Date in YYYY-MM-DD format (optional)")] = None
+) -> dict:
+    """Returns the base64 image data for a date, without re-sending the metadata.
+
+    Lets clients fetch metadata via get_apod and the image separately (or
+    concurrently) instead of waiting on one combined response.
+    """
+    metadata = await fetch_apod(date)
+    image_url = metadata.get("url")
+    image_base64 = await _fetch_image_base64(image_url) if image_url else None
+    return {
+        "date": metadata.get("date"),
+        "url": image_url,
+        "image_base64": image_base64,
+    }
 
 
 @mcp.tool(description="Get planetary information")
+@mcp_errors
 async def get_planet(
     planet_name: Annotated[str, Field(description="Planet name (e.g., mars, jupiter)")]
 ) -> dict:
     """Returns facts about a planet"""
-    try:
-        return await fetch_planet_info(planet_name)
-    except Exception as e:
-        raise McpError(ErrorData(
-            code=INTERNAL_ERROR,
-            message=f"Planet fetch error: {str(e)}"
-        ))
+    return await fetch_planet_info(planet_name)
 
 # ===== run server =====
 async def main():
-    print("🚀 Starting NASA Astronomy MCP server in STATELESS mode on http://0.0.0.0:8086")
-    await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    global _client
+    _client = httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0),
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=20,
+            keepalive_expiry=300,
+        ),
+        http2=True,
+        follow_redirects=True,
+    )
+    try:
+        print("🚀 Starting NASA Astronomy MCP server in STATELESS mode on http://0.0.0.0:8086")
+        await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    finally:
+        await _client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())